@@ -0,0 +1,29 @@
+// Message protocol between converter.ts and the AVIF encoder worker.
+
+// Encoder settings chosen on the page; quality is sent separately as it applies to every format.
+export type AvifOptions = {
+	speed: number; // 0 (slowest) - 10 (fastest)
+	subsample: number; // 1 = 4:2:0, 3 = 4:4:4
+	threads: number; // threads the encode runs on; only used to pick the tile layout
+};
+
+type AvifEncodeRequestBase = AvifOptions & {
+	id: number;
+	quality: number; // 0.0 - 1.0
+};
+
+export type AvifEncodeRequest =
+	| (AvifEncodeRequestBase & { type: 'encode-avif'; width: number; height: number; rgba: ArrayBuffer })
+	| (AvifEncodeRequestBase & {
+			// Decoded inside the worker; only the File handle is cloned, not its pixels.
+			type: 'encode-avif-file';
+			file: Blob;
+			maxDimension: number; // 0 = keep the original size
+	  });
+
+// Loads and instantiates the WASM encoder ahead of the first real request.
+export type AvifWarmupRequest = { type: 'warmup' };
+
+export type AvifEncodeResponse =
+	| { type: 'encode-avif-result'; id: number; ok: true; mime: 'image/avif'; bytes: ArrayBuffer }
+	| { type: 'encode-avif-result'; id: number; ok: false; error: string };
@@ -1,30 +1,62 @@
+import type { AvifEncodeRequest, AvifEncodeResponse, AvifOptions, AvifWarmupRequest } from './avif-messages';
+import { decodeBitmap, releaseDecoded } from './image-decode';
+
 type OutputFormat = 'webp' | 'avif';
 
-type AvifEncodeRequest = {
-	type: 'encode-avif';
-	id: number;
-	width: number;
-	height: number;
-	rgba: ArrayBuffer;
-	quality: number; // 0.0 - 1.0
+type EncodeSettings = {
+	format: OutputFormat;
+	quality01: number;
+	maxDimension: number; // 0 = keep the original size
+	keepSameFormat: boolean; // output inputs already in the target format as-is
+	avif: AvifOptions;
 };
 
-type AvifEncodeResponse =
-	| { type: 'encode-avif-result'; id: number; ok: true; mime: 'image/avif'; bytes: ArrayBuffer }
-	| { type: 'encode-avif-result'; id: number; ok: false; error: string };
+// Output of the decode stage, in whatever form the chosen encoder consumes directly.
+type EncodeSource =
+	| { kind: 'file'; file: File } // decoded inside the AVIF worker
+	| { kind: 'bitmap'; bitmap: ImageBitmap } // drawn straight onto the encoding canvas
+	| { kind: 'pixels'; imageData: ImageData }; // RGBA handed to the AVIF worker
 
 type ItemStatus = 'ready' | 'converting' | 'done' | 'error';
 type Item = {
 	id: number;
 	file: File;
+	baseName: string; // file name without extension, computed once on add
 	inputUrl: string;
 	status: ItemStatus;
 	outputBlob: Blob | null;
 	outputMime: string | null;
+	outputName: string | null;
 	outputSize: number | null;
 	error: string | null;
 };
 
+const SUPPORTED_TYPES = new Set(['image/jpeg', 'image/png', 'image/webp', 'image/avif']);
+// Used when the browser reports no MIME type for a dropped file.
+const SUPPORTED_EXTENSIONS = new Set(['jpg', 'jpeg', 'png', 'webp', 'avif']);
+
+function fileExtension(file: File): string {
+	const lastDot = file.name.lastIndexOf('.');
+	return lastDot > 0 ? file.name.slice(lastDot + 1).toLowerCase() : '';
+}
+
+function isSupportedFile(file: File): boolean {
+	if (file.type) return SUPPORTED_TYPES.has(file.type);
+	return SUPPORTED_EXTENSIONS.has(fileExtension(file));
+}
+
+// Same fallback as isSupportedFile(): trust the extension when the browser reports no type.
+function isFileOfFormat(file: File, format: OutputFormat): boolean {
+	if (file.type) return file.type === `image/${format}`;
+	return fileExtension(file) === format;
+}
+
+// With keepSameFormat on, a same-format input is passed through untouched, skipping both
+// decode and encode. A resize is an explicit request for new pixels, so it always encodes.
+function keepsOriginal(file: File, settings: EncodeSettings): boolean {
+	return settings.keepSameFormat && settings.maxDimension === 0 && isFileOfFormat(file, settings.format);
+}
+
 function assertEl<T extends Element>(el: T | null, name: string): T {
 	if (!el) throw new Error(`Missing element: ${name}`);
 	return el;
@@ -47,10 +79,6 @@ function stripExt(filename: string): string {
 	return lastDot > 0 ? filename.slice(0, lastDot) : filename;
 }
 
-function withExt(filename: string, ext: string): string {
-	return `${stripExt(filename)}.${ext}`;
-}
-
 function canvasToBlob(canvas: HTMLCanvasElement, type: string, quality?: number): Promise<Blob> {
 	return new Promise((resolve, reject) => {
 		canvas.toBlob(
@@ -64,51 +92,195 @@ function canvasToBlob(canvas: HTMLCanvasElement, type: string, quality?: number)
 	});
 }
 
-let avifWorker: Worker | null = null;
+// Each worker owns its own WASM encoder instance, so a pool lets a batch encode
+// several images at once instead of queueing them behind a single worker.
+const maxConcurrency = Math.max(1, navigator.hardwareConcurrency || 1);
+
+// Every AVIF worker holds a WASM heap that never shrinks, plus a full-resolution image
+// when it decodes the file itself, so the pool is capped well below the core count.
+// Canvas encoders (WebP, native AVIF) share the page's memory and use every core.
+const deviceMemoryGiB = (navigator as Navigator & { deviceMemory?: number }).deviceMemory;
+const maxAvifWorkers = Math.min(maxConcurrency, deviceMemoryGiB !== undefined && deviceMemoryGiB <= 4 ? 2 : 4);
+
+// Each idle worker keeps its WASM heap at its peak size, so workers that sit idle this
+// long are terminated; the next batch spawns (and warms) fresh ones as needed.
+const AVIF_WORKER_IDLE_MS = 30_000;
+// Warming every core's worker before the user even converts would pay for WASM heaps
+// that may never be used; a couple is enough to hide the first-encode latency.
+const AVIF_PREWARM_WORKERS = 2;
+
+type AvifWorkerSlot = { worker: Worker; inFlight: number; idleTimer: ReturnType<typeof setTimeout> | undefined };
+const avifWorkers: AvifWorkerSlot[] = [];
 let avifReqId = 0;
 const avifPending = new Map<number, { resolve: (v: ArrayBuffer) => void; reject: (e: Error) => void }>();
 
-function getAvifWorker(): Worker {
-	if (avifWorker) return avifWorker;
-	avifWorker = new Worker(new URL('../workers/avif-encoder.worker.ts', import.meta.url), { type: 'module' });
-	avifWorker.addEventListener('message', (ev: MessageEvent<AvifEncodeResponse>) => {
-		const msg = ev.data;
-		if (!msg || msg.type !== 'encode-avif-result') return;
-		const pending = avifPending.get(msg.id);
-		if (!pending) return;
-		avifPending.delete(msg.id);
-		if (msg.ok) pending.resolve(msg.bytes);
-		else pending.reject(new Error(msg.error));
-	});
-	avifWorker.addEventListener('error', (ev) => {
+function handleAvifMessage(ev: MessageEvent<AvifEncodeResponse>) {
+	const msg = ev.data;
+	if (!msg || msg.type !== 'encode-avif-result') return;
+	const pending = avifPending.get(msg.id);
+	if (!pending) return;
+	avifPending.delete(msg.id);
+	if (msg.ok) pending.resolve(msg.bytes);
+	else pending.reject(new Error(msg.error));
+}
+
+function getAvifWorker(): AvifWorkerSlot {
+	// Prefer an idle worker, grow the pool up to maxAvifWorkers, otherwise pick the least loaded one.
+	let best: AvifWorkerSlot | null = null;
+	for (const slot of avifWorkers) {
+		if (!best || slot.inFlight < best.inFlight) best = slot;
+	}
+	if (best && (best.inFlight === 0 || avifWorkers.length >= maxAvifWorkers)) return best;
+	return spawnAvifWorker();
+}
+
+function spawnAvifWorker(): AvifWorkerSlot {
+	const worker = new Worker(new URL('../workers/avif-encoder.worker.ts', import.meta.url), { type: 'module' });
+	worker.addEventListener('message', handleAvifMessage);
+	worker.addEventListener('error', (ev) => {
 		console.error(ev);
 	});
-	return avifWorker;
+	const warmup: AvifWarmupRequest = { type: 'warmup' };
+	worker.postMessage(warmup);
+	const slot: AvifWorkerSlot = { worker, inFlight: 0, idleTimer: undefined };
+	avifWorkers.push(slot);
+	scheduleIdleTerminate(slot);
+	return slot;
 }
 
-async function encodeAvifInWorker(imageData: ImageData, quality01: number): Promise<Blob> {
-	const worker = getAvifWorker();
+function scheduleIdleTerminate(slot: AvifWorkerSlot) {
+	clearTimeout(slot.idleTimer);
+	slot.idleTimer = setTimeout(() => {
+		if (slot.inFlight > 0) return;
+		slot.worker.terminate();
+		const index = avifWorkers.indexOf(slot);
+		if (index >= 0) avifWorkers.splice(index, 1);
+	}, AVIF_WORKER_IDLE_MS);
+}
+
+// Spawning a worker and compiling the WASM encoder is a one-off cost per worker;
+// paying it while the user is still picking settings keeps it off the first encode.
+async function prewarmAvifWorkers(count: number) {
+	if (await supportsNativeAvif()) return;
+	const target = Math.min(count, AVIF_PREWARM_WORKERS, await encodeLanes('avif'));
+	while (avifWorkers.length < target) spawnAvifWorker();
+}
+
+// Number of images worth encoding side by side in the given format.
+async function encodeLanes(format: OutputFormat): Promise<number> {
+	if (format === 'webp' || (await supportsNativeAvif())) return maxConcurrency;
+	// Under cross-origin isolation @jsquash/avif loads its multi-threaded build, whose thread
+	// pool is sized to every core and cannot be narrowed, so one encode already fills the
+	// machine and a second would only oversubscribe it.
+	return crossOriginIsolated ? 1 : maxAvifWorkers;
+}
+
+// Workers can only decode when OffscreenCanvas is available; otherwise the main thread
+// decodes and ships the RGBA buffer over instead.
+const canDecodeInWorker = typeof OffscreenCanvas !== 'undefined' && typeof createImageBitmap === 'function';
+
+type EncodeMessage<T> = T extends unknown ? Omit<T, 'id'> : never;
+
+async function requestAvifEncode(msg: EncodeMessage<AvifEncodeRequest>, transfer: Transferable[] = []): Promise<Blob> {
+	const slot = getAvifWorker();
 	const id = ++avifReqId;
-	const rgbaCopy = imageData.data.slice().buffer;
 
-	const bytes = await new Promise<ArrayBuffer>((resolve, reject) => {
-		avifPending.set(id, { resolve, reject });
-		const msg: AvifEncodeRequest = {
+	slot.inFlight++;
+	clearTimeout(slot.idleTimer);
+	try {
+		const bytes = await new Promise<ArrayBuffer>((resolve, reject) => {
+			avifPending.set(id, { resolve, reject });
+			const request = { ...msg, id } as AvifEncodeRequest;
+			slot.worker.postMessage(request, { transfer });
+		});
+		return new Blob([bytes], { type: 'image/avif' });
+	} finally {
+		slot.inFlight--;
+		if (slot.inFlight === 0) scheduleIdleTerminate(slot);
+	}
+}
+
+async function encodeAvifInWorker(imageData: ImageData, quality01: number, options: AvifOptions): Promise<Blob> {
+	// Callers hand over a freshly decoded ImageData, so transfer its buffer instead of copying it.
+	const rgba = imageData.data.buffer as ArrayBuffer;
+	return await requestAvifEncode(
+		{
 			type: 'encode-avif',
-			id,
 			width: imageData.width,
 			height: imageData.height,
-			rgba: rgbaCopy,
+			rgba,
 			quality: quality01,
-		};
-		worker.postMessage(msg, { transfer: [rgbaCopy] });
-	});
+			...options,
+		},
+		[rgba]
+	);
+}
 
-	return new Blob([bytes], { type: 'image/avif' });
+async function encodeAvifFileInWorker(
+	file: File,
+	maxDimension: number,
+	quality01: number,
+	options: AvifOptions
+): Promise<Blob> {
+	return await requestAvifEncode({ type: 'encode-avif-file', file, maxDimension, quality: quality01, ...options });
+}
+
+// Browsers that can encode AVIF natively via canvas.toBlob (possibly hardware-backed) skip
+// the WASM encoder entirely. Unsupported types silently fall back to PNG, so probe once.
+let nativeAvifPromise: Promise<boolean> | null = null;
+
+function supportsNativeAvif(): Promise<boolean> {
+	if (!nativeAvifPromise) {
+		const canvas = document.createElement('canvas');
+		canvas.width = 1;
+		canvas.height = 1;
+		nativeAvifPromise = canvasToBlob(canvas, 'image/avif').then(
+			(blob) => blob.type === 'image/avif',
+			() => false
+		);
+	}
+	return nativeAvifPromise;
+}
+
+// How many decoded images convertAll() may hold waiting for a free encoder.
+const DECODE_AHEAD = 2;
+
+// Async producer/consumer queue: put() waits while the queue is full, take() resolves
+// to null once the queue is closed and drained.
+function createBoundedQueue<T>(capacity: number) {
+	const buffer: T[] = [];
+	const takers: Array<(value: T | null) => void> = [];
+	const putters: Array<() => void> = [];
+	let closed = false;
+
+	return {
+		async put(value: T) {
+			while (buffer.length >= capacity) {
+				await new Promise<void>((resolve) => putters.push(resolve));
+			}
+			const taker = takers.shift();
+			if (taker) taker(value);
+			else buffer.push(value);
+		},
+		take(): Promise<T | null> {
+			if (buffer.length > 0) {
+				const value = buffer.shift() as T;
+				putters.shift()?.();
+				return Promise.resolve(value);
+			}
+			if (closed) return Promise.resolve(null);
+			return new Promise((resolve) => takers.push(resolve));
+		},
+		close() {
+			closed = true;
+			for (const taker of takers.splice(0)) taker(null);
+		},
+	};
 }
 
 function setText(el: Element, text: string) {
-	el.textContent = text;
+	// Assigning textContent always replaces the child text node, even when the text is unchanged.
+	if (el.textContent !== text) el.textContent = text;
 }
 
 async function saveBlob(blob: Blob, filename: string) {
@@ -153,14 +325,25 @@ async function saveBlob(blob: Blob, filename: string) {
 	setTimeout(() => URL.revokeObjectURL(url), 0);
 }
 
+// The 8 shift/xor steps per byte only depend on the byte value, so they are precomputed
+// once into a 256-entry table instead of being repeated for every byte of every entry.
+const CRC32_TABLE = (() => {
+	const table = new Uint32Array(256);
+	for (let n = 0; n < 256; n++) {
+		let c = n;
+		for (let j = 0; j < 8; j++) {
+			const mask = -(c & 1);
+			c = (c >>> 1) ^ (0xedb88320 & mask);
+		}
+		table[n] = c >>> 0;
+	}
+	return table;
+})();
+
 function crc32(bytes: Uint8Array): number {
 	let crc = 0xffffffff;
 	for (let i = 0; i < bytes.length; i++) {
-		crc ^= bytes[i];
-		for (let j = 0; j < 8; j++) {
-			const mask = -(crc & 1);
-			crc = (crc >>> 1) ^ (0xedb88320 & mask);
-		}
+		crc = CRC32_TABLE[(crc ^ bytes[i]) & 0xff] ^ (crc >>> 8);
 	}
 	return (crc ^ 0xffffffff) >>> 0;
 }
@@ -197,14 +380,19 @@ async function buildZip(entries: Array<{ name: string; blob: Blob }>): Promise<B
 	const encoder = new TextEncoder();
 	const localParts: Uint8Array[] = [];
 	const centralParts: Uint8Array[] = [];
+	const flags = 1 << 11; // UTF-8
 	let offset = 0;
 
-	for (const entry of entries) {
+	// Read every blob concurrently; the archive holds all of them in memory anyway, and
+	// Promise.all surfaces the first failure instead of leaving later rejections unhandled.
+	const buffers = await Promise.all(entries.map((entry) => entry.blob.arrayBuffer()));
+
+	for (let i = 0; i < entries.length; i++) {
+		const entry = entries[i];
 		const nameBytes = encoder.encode(entry.name);
-		const dataBytes = new Uint8Array(await entry.blob.arrayBuffer());
+		const dataBytes = new Uint8Array(buffers[i]);
 		const crc = crc32(dataBytes);
 		const size = dataBytes.byteLength;
-		const flags = 1 << 11; // UTF-8
 
 		// Local file header
 		const localHeader = concat([
@@ -265,10 +453,41 @@ async function buildZip(entries: Array<{ name: string; blob: Blob }>): Promise<B
 		u16(0),
 	]);
 
-	const zipBytes = concat([...localParts, centralDir, end]);
-	return new Blob([zipBytes], { type: 'application/zip' });
+	// Let the Blob reference the parts directly rather than concatenating them into one more full copy.
+	return new Blob([...localParts, centralDir, end], { type: 'application/zip' });
 }
 
+// Static row markup is parsed once and cloned per row, instead of running the HTML
+// parser through innerHTML for every item on every render.
+function htmlTemplate(markup: string): () => DocumentFragment {
+	let template: HTMLTemplateElement | null = null;
+	return () => {
+		if (!template) {
+			template = document.createElement('template');
+			template.innerHTML = markup;
+		}
+		return template.content.cloneNode(true) as DocumentFragment;
+	};
+}
+
+const convertingIcon = htmlTemplate(
+	'<svg class="w-8 h-8 text-white animate-spin" fill="none" stroke="currentColor" viewBox="0 0 24 24"><circle class="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" stroke-width="4"></circle><path class="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.647z"></path></svg>'
+);
+const doneIcon = htmlTemplate(
+	'<svg class="w-8 h-8 text-white" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M5 13l4 4L19 7" /></svg>'
+);
+const errorIcon = htmlTemplate(
+	'<svg class="w-8 h-8 text-white" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M6 18L18 6M6 6l12 12" /></svg>'
+);
+const convertButtonContent = htmlTemplate(
+	'<svg class="w-4 h-4" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M4 4v5h.582m15.356 2A8.001 8.001 0 004.582 9m0 0H9m11 11v-5h-.581m0 0a8.003 8.003 0 01-15.357-2m15.357 2H15" /></svg><span>変換</span>'
+);
+const downloadButtonContent = htmlTemplate(
+	'<svg class="w-4 h-4" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M4 16v1a3 3 0 003 3h10a3 3 0 003-3v-1m-4-4l-4 4m0 0l-4-4m4 4V4" /></svg><span>ダウンロード</span>'
+);
+const rowButtonClass =
+	'flex items-center gap-1.5 border border-[var(--border)] px-4 py-1.5 rounded text-sm hover:enabled:border-[var(--text)] disabled:opacity-30 disabled:cursor-not-allowed transition-colors';
+
 function main() {
 	const dropzone = assertEl(document.querySelector<HTMLDivElement>('#dropzone'), '#dropzone');
 	const pickBtn = assertEl(document.querySelector<HTMLButtonElement>('#pickBtn'), '#pickBtn');
@@ -277,6 +496,14 @@ function main() {
 	const formatSelect = assertEl(document.querySelector<HTMLSelectElement>('#formatSelect'), '#formatSelect');
 	const qualitySlider = assertEl(document.querySelector<HTMLInputElement>('#qualitySlider'), '#qualitySlider');
 	const qualityValue = assertEl(document.querySelector<HTMLSpanElement>('#qualityValue'), '#qualityValue');
+	const sizeSelect = assertEl(document.querySelector<HTMLSelectElement>('#sizeSelect'), '#sizeSelect');
+	const keepSameFormatCheckbox = assertEl(
+		document.querySelector<HTMLInputElement>('#keepSameFormatCheckbox'),
+		'#keepSameFormatCheckbox'
+	);
+	const avifOptionsEl = assertEl(document.querySelector<HTMLDivElement>('#avifOptions'), '#avifOptions');
+	const speedSelect = assertEl(document.querySelector<HTMLSelectElement>('#speedSelect'), '#speedSelect');
+	const subsampleSelect = assertEl(document.querySelector<HTMLSelectElement>('#subsampleSelect'), '#subsampleSelect');
 	const convertBtn = assertEl(document.querySelector<HTMLButtonElement>('#convertBtn'), '#convertBtn');
 	const downloadAllBtn = assertEl(document.querySelector<HTMLButtonElement>('#downloadAllBtn'), '#downloadAllBtn');
 	const clearBtn = assertEl(document.querySelector<HTMLButtonElement>('#clearBtn'), '#clearBtn');
@@ -297,6 +524,10 @@ function main() {
 		fileInput.disabled = next;
 		formatSelect.disabled = next;
 		qualitySlider.disabled = next;
+		sizeSelect.disabled = next;
+		keepSameFormatCheckbox.disabled = next;
+		speedSelect.disabled = next;
+		subsampleSelect.disabled = next;
 		if (next) setText(statusEl, '変換中');
 		// The per-item buttons are rendered dynamically; re-render when busy state changes
 		// so "ダウンロード" becomes clickable after conversion completes.
@@ -315,6 +546,7 @@ function main() {
 		for (const item of items) {
 			item.outputBlob = null;
 			item.outputMime = null;
+			item.outputName = null;
 			item.outputSize = null;
 			item.error = null;
 			item.status = 'ready';
@@ -345,134 +577,179 @@ function main() {
 		setText(statusEl, '');
 	}
 
+	// Per-item status changes in a batch are coalesced into at most one render per frame.
+	// render() itself flushes immediately, e.g. when setBusy(false) ends a batch.
+	let renderFrame = 0;
+	const rowCache = new Map<number, { key: string; row: HTMLDivElement }>();
+
+	function scheduleRender() {
+		if (renderFrame) return;
+		renderFrame = requestAnimationFrame(() => {
+			renderFrame = 0;
+			render();
+		});
+	}
+
 	function render() {
+		if (renderFrame) {
+			cancelAnimationFrame(renderFrame);
+			renderFrame = 0;
+		}
 		updateMeta();
 		convertBtn.disabled = isBusy || items.length === 0;
 		clearBtn.disabled = isBusy || items.length === 0;
 		downloadAllBtn.disabled = isBusy || items.every((it) => !it.outputBlob);
 
-		fileList.replaceChildren();
+		// Rows are cached by the state they display, so an update only rebuilds
+		// the rows that actually changed instead of the whole list.
+		const rows: HTMLDivElement[] = [];
+		const liveIds = new Set<number>();
 		for (const item of items) {
-			const row = document.createElement('div');
-			row.className = 'border border-[var(--border)] rounded-lg p-4';
-
-			const container = document.createElement('div');
-			container.className = 'flex gap-4';
-
-			const thumb = document.createElement('div');
-			thumb.className = 'w-24 h-24 rounded border border-[var(--border)] overflow-hidden shrink-0 bg-[var(--bg)] relative';
-			const img = document.createElement('img');
-			img.alt = item.file.name;
-			img.src = item.inputUrl;
-			img.className = 'w-full h-full object-cover';
-			thumb.appendChild(img);
-
-			// Status icon overlay
-			const statusIcon = document.createElement('div');
-			statusIcon.className = 'absolute inset-0 flex items-center justify-center bg-black bg-opacity-50';
-			if (item.status === 'converting') {
-				statusIcon.innerHTML = '<svg class="w-8 h-8 text-white animate-spin" fill="none" stroke="currentColor" viewBox="0 0 24 24"><circle class="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" stroke-width="4"></circle><path class="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.647z"></path></svg>';
-				thumb.appendChild(statusIcon);
-			} else if (item.status === 'done') {
-				statusIcon.innerHTML = '<svg class="w-8 h-8 text-white" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M5 13l4 4L19 7" /></svg>';
-				thumb.appendChild(statusIcon);
-			} else if (item.status === 'error') {
-				statusIcon.innerHTML = '<svg class="w-8 h-8 text-white" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M6 18L18 6M6 6l12 12" /></svg>';
-				thumb.appendChild(statusIcon);
+			const key = `${item.status}|${item.outputSize}|${isBusy}`;
+			liveIds.add(item.id);
+			let cached = rowCache.get(item.id);
+			if (!cached || cached.key !== key) {
+				cached = { key, row: renderRow(item) };
+				rowCache.set(item.id, cached);
 			}
+			rows.push(cached.row);
+		}
+		for (const id of rowCache.keys()) {
+			if (!liveIds.has(id)) rowCache.delete(id);
+		}
 
-			const content = document.createElement('div');
-			content.className = 'flex-1 min-w-0 flex flex-col justify-between';
-
-			const info = document.createElement('div');
-
-			const nameRow = document.createElement('div');
-			nameRow.className = 'flex items-center gap-2 mb-2';
-
-			const name = document.createElement('div');
-			name.className = 'text-sm text-[var(--text)] truncate flex-1';
-			name.textContent = item.file.name;
-
-			// Status badge
-			const badge = document.createElement('div');
-			badge.className = 'shrink-0 px-2 py-0.5 rounded text-xs';
-			if (item.status === 'converting') {
-				badge.className += ' bg-blue-100 text-blue-700';
-				badge.textContent = '変換中';
-			} else if (item.status === 'done') {
-				badge.className += ' bg-green-100 text-green-700';
-				badge.textContent = '完了';
-			} else if (item.status === 'error') {
-				badge.className += ' bg-red-100 text-red-700';
-				badge.textContent = 'エラー';
-			} else {
-				badge.className += ' bg-gray-100 text-gray-700';
-				badge.textContent = '待機中';
-			}
+		const current = fileList.children;
+		if (current.length === rows.length) {
+			rows.forEach((row, i) => {
+				if (current[i] !== row) current[i].replaceWith(row);
+			});
+		} else {
+			fileList.replaceChildren(...rows);
+		}
+	}
 
-			nameRow.appendChild(name);
-			nameRow.appendChild(badge);
+	function renderRow(item: Item): HTMLDivElement {
+		const row = document.createElement('div');
+		row.className = 'border border-[var(--border)] rounded-lg p-4';
+
+		const container = document.createElement('div');
+		container.className = 'flex gap-4';
+
+		const thumb = document.createElement('div');
+		thumb.className = 'w-24 h-24 rounded border border-[var(--border)] overflow-hidden shrink-0 bg-[var(--bg)] relative';
+		const img = document.createElement('img');
+		img.alt = item.file.name;
+		img.src = item.inputUrl;
+		img.className = 'w-full h-full object-cover';
+		thumb.appendChild(img);
+
+		// Status icon overlay
+		const statusIcon = document.createElement('div');
+		statusIcon.className = 'absolute inset-0 flex items-center justify-center bg-black bg-opacity-50';
+		if (item.status === 'converting') {
+			statusIcon.appendChild(convertingIcon());
+			thumb.appendChild(statusIcon);
+		} else if (item.status === 'done') {
+			statusIcon.appendChild(doneIcon());
+			thumb.appendChild(statusIcon);
+		} else if (item.status === 'error') {
+			statusIcon.appendChild(errorIcon());
+			thumb.appendChild(statusIcon);
+		}
 
-			const sub = document.createElement('div');
-			sub.className = 'text-sm text-[var(--muted)] mb-2';
-			if (item.status === 'done') {
-				sub.textContent = `${formatBytes(item.file.size)} → ${formatBytes(item.outputSize ?? 0)}`;
-			} else {
-				sub.textContent = formatBytes(item.file.size);
-			}
+		const content = document.createElement('div');
+		content.className = 'flex-1 min-w-0 flex flex-col justify-between';
+
+		const info = document.createElement('div');
+
+		const nameRow = document.createElement('div');
+		nameRow.className = 'flex items-center gap-2 mb-2';
+
+		const name = document.createElement('div');
+		name.className = 'text-sm text-[var(--text)] truncate flex-1';
+		name.textContent = item.file.name;
+
+		// Status badge
+		const badge = document.createElement('div');
+		badge.className = 'shrink-0 px-2 py-0.5 rounded text-xs';
+		if (item.status === 'converting') {
+			badge.className += ' bg-blue-100 text-blue-700';
+			badge.textContent = '変換中';
+		} else if (item.status === 'done') {
+			badge.className += ' bg-green-100 text-green-700';
+			badge.textContent = '完了';
+		} else if (item.status === 'error') {
+			badge.className += ' bg-red-100 text-red-700';
+			badge.textContent = 'エラー';
+		} else {
+			badge.className += ' bg-gray-100 text-gray-700';
+			badge.textContent = '待機中';
+		}
 
-			// Progress bar for done items
-			if (item.status === 'done' && item.outputSize) {
-				const progressContainer = document.createElement('div');
-				progressContainer.className = 'w-full bg-gray-200 rounded-full h-1.5 mb-2';
-				const progressBar = document.createElement('div');
-				const reduction = Math.max(0, Math.min(100, ((item.file.size - item.outputSize) / item.file.size) * 100));
-				progressBar.className = 'bg-green-600 h-1.5 rounded-full transition-all duration-300';
-				progressBar.style.width = `${reduction}%`;
-				progressContainer.appendChild(progressBar);
-				
-				const reductionText = document.createElement('div');
-				reductionText.className = 'text-xs text-green-600 mt-1';
-				reductionText.textContent = `${reduction.toFixed(0)}% 削減`;
-				
-				info.appendChild(nameRow);
-				info.appendChild(sub);
-				info.appendChild(progressContainer);
-				info.appendChild(reductionText);
-			} else {
-				info.appendChild(nameRow);
-				info.appendChild(sub);
-			}
+		nameRow.appendChild(name);
+		nameRow.appendChild(badge);
 
-			const actions = document.createElement('div');
-			actions.className = 'flex gap-2 mt-3';
+		const sub = document.createElement('div');
+		sub.className = 'text-sm text-[var(--muted)] mb-2';
+		if (item.status === 'done') {
+			sub.textContent = `${formatBytes(item.file.size)} → ${formatBytes(item.outputSize ?? 0)}`;
+		} else {
+			sub.textContent = formatBytes(item.file.size);
+		}
 
-			const convertOneBtn = document.createElement('button');
-			convertOneBtn.type = 'button';
-			convertOneBtn.className = 'flex items-center gap-1.5 border border-[var(--border)] px-4 py-1.5 rounded text-sm hover:enabled:border-[var(--text)] disabled:opacity-30 disabled:cursor-not-allowed transition-colors';
-			convertOneBtn.innerHTML = '<svg class="w-4 h-4" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M4 4v5h.582m15.356 2A8.001 8.001 0 004.582 9m0 0H9m11 11v-5h-.581m0 0a8.003 8.003 0 01-15.357-2m15.357 2H15" /></svg><span>変換</span>';
-			convertOneBtn.disabled = isBusy;
-			convertOneBtn.addEventListener('click', () => void convertOne(item.id));
+		// Progress bar for done items
+		if (item.status === 'done' && item.outputSize) {
+			const progressContainer = document.createElement('div');
+			progressContainer.className = 'w-full bg-gray-200 rounded-full h-1.5 mb-2';
+			const progressBar = document.createElement('div');
+			const reduction = Math.max(0, Math.min(100, ((item.file.size - item.outputSize) / item.file.size) * 100));
+			progressBar.className = 'bg-green-600 h-1.5 rounded-full transition-all duration-300';
+			progressBar.style.width = `${reduction}%`;
+			progressContainer.appendChild(progressBar);
+			
+			const reductionText = document.createElement('div');
+			reductionText.className = 'text-xs text-green-600 mt-1';
+			reductionText.textContent = `${reduction.toFixed(0)}% 削減`;
+			
+			info.appendChild(nameRow);
+			info.appendChild(sub);
+			info.appendChild(progressContainer);
+			info.appendChild(reductionText);
+		} else {
+			info.appendChild(nameRow);
+			info.appendChild(sub);
+		}
 
-			const dlBtn = document.createElement('button');
-			dlBtn.type = 'button';
-			dlBtn.className = 'flex items-center gap-1.5 border border-[var(--border)] px-4 py-1.5 rounded text-sm hover:enabled:border-[var(--text)] disabled:opacity-30 disabled:cursor-not-allowed transition-colors';
-			dlBtn.innerHTML = '<svg class="w-4 h-4" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M4 16v1a3 3 0 003 3h10a3 3 0 003-3v-1m-4-4l-4 4m0 0l-4-4m4 4V4" /></svg><span>ダウンロード</span>';
-			dlBtn.disabled = isBusy || !item.outputBlob;
-			dlBtn.addEventListener('click', () => void download(item.id));
+		const actions = document.createElement('div');
+		actions.className = 'flex gap-2 mt-3';
 
-			actions.appendChild(convertOneBtn);
-			actions.appendChild(dlBtn);
+		const convertOneBtn = document.createElement('button');
+		convertOneBtn.type = 'button';
+		convertOneBtn.className = rowButtonClass;
+		convertOneBtn.appendChild(convertButtonContent());
+		convertOneBtn.disabled = isBusy;
+		convertOneBtn.dataset.action = 'convert';
+		convertOneBtn.dataset.itemId = String(item.id);
 
-			content.appendChild(info);
-			content.appendChild(actions);
+		const dlBtn = document.createElement('button');
+		dlBtn.type = 'button';
+		dlBtn.className = rowButtonClass;
+		dlBtn.appendChild(downloadButtonContent());
+		dlBtn.disabled = isBusy || !item.outputBlob;
+		dlBtn.dataset.action = 'download';
+		dlBtn.dataset.itemId = String(item.id);
 
-			container.appendChild(thumb);
-			container.appendChild(content);
+		actions.appendChild(convertOneBtn);
+		actions.appendChild(dlBtn);
 
-			row.appendChild(container);
-			fileList.appendChild(row);
-		}
+		content.appendChild(info);
+		content.appendChild(actions);
+
+		container.appendChild(thumb);
+		container.appendChild(content);
+
+		row.appendChild(container);
+		return row;
 	}
 
 	function addFiles(files: File[]) {
@@ -481,12 +758,12 @@ function main() {
 		const rejected: File[] = [];
 
 		for (const f of files) {
-			if (['image/jpeg', 'image/png'].includes(f.type)) accepted.push(f);
+			if (isSupportedFile(f)) accepted.push(f);
 			else rejected.push(f);
 		}
 
 		if (rejected.length > 0) {
-			setError('JPG または PNG のみ対応しています。');
+			setError('JPG / PNG / WebP / AVIF のみ対応しています。');
 		}
 
 		for (const file of accepted) {
@@ -494,28 +771,99 @@ function main() {
 			items.push({
 				id: ++nextItemId,
 				file,
+				baseName: stripExt(file.name),
 				inputUrl,
 				status: 'ready',
 				outputBlob: null,
 				outputMime: null,
+				outputName: null,
 				outputSize: null,
 				error: null,
 			});
 		}
 
 		render();
+		prewarmEncoders();
 	}
 
-	async function decodeToImageData(file: File): Promise<ImageData> {
-		const bitmap = await createImageBitmap(file);
+	async function decodeToImageData(file: File, maxDimension: number): Promise<ImageData> {
+		const bitmap = await decodeBitmap(file, maxDimension);
 		const canvas = document.createElement('canvas');
-		canvas.width = bitmap.width;
-		canvas.height = bitmap.height;
-		const ctx = canvas.getContext('2d', { willReadFrequently: true });
-		if (!ctx) throw new Error('Canvas 2D コンテキストを作成できませんでした。');
-		ctx.drawImage(bitmap, 0, 0);
-		bitmap.close();
-		return ctx.getImageData(0, 0, canvas.width, canvas.height);
+		try {
+			canvas.width = bitmap.width;
+			canvas.height = bitmap.height;
+			const ctx = canvas.getContext('2d', { willReadFrequently: true });
+			if (!ctx) throw new Error('Canvas 2D コンテキストを作成できませんでした。');
+			ctx.drawImage(bitmap, 0, 0);
+			return ctx.getImageData(0, 0, canvas.width, canvas.height);
+		} finally {
+			releaseDecoded(bitmap, canvas);
+		}
+	}
+
+	async function encodeBitmap(bitmap: ImageBitmap, type: string, quality01: number): Promise<Blob> {
+		const canvas = document.createElement('canvas');
+		try {
+			canvas.width = bitmap.width;
+			canvas.height = bitmap.height;
+			const ctx = canvas.getContext('2d');
+			if (!ctx) throw new Error('Canvas 2D コンテキストを作成できませんでした。');
+			ctx.drawImage(bitmap, 0, 0);
+			return await canvasToBlob(canvas, type, quality01);
+		} finally {
+			releaseDecoded(bitmap, canvas);
+		}
+	}
+
+	function readSettings(): EncodeSettings {
+		return {
+			format: formatSelect.value as OutputFormat,
+			quality01: Number(qualitySlider.value) / 100,
+			maxDimension: Number(sizeSelect.value),
+			keepSameFormat: keepSameFormatCheckbox.checked,
+			avif: {
+				speed: Number(speedSelect.value),
+				subsample: Number(subsampleSelect.value),
+				// Only the threaded WASM build tiles, and it runs one encode at a time (see
+				// encodeLanes()) across a thread pool spanning every core.
+				threads: maxConcurrency,
+			},
+		};
+	}
+
+	async function decodeStage(file: File, settings: EncodeSettings): Promise<EncodeSource> {
+		// Canvas encoders draw the bitmap directly; reading it back into ImageData first
+		// would cost two extra full-image copies (getImageData + putImageData).
+		if (settings.format === 'webp' || (await supportsNativeAvif())) {
+			return { kind: 'bitmap', bitmap: await decodeBitmap(file, settings.maxDimension) };
+		}
+		if (canDecodeInWorker) return { kind: 'file', file };
+		return { kind: 'pixels', imageData: await decodeToImageData(file, settings.maxDimension) };
+	}
+
+	async function encodeStage(source: EncodeSource, settings: EncodeSettings): Promise<Blob> {
+		const { format, quality01, avif } = settings;
+		switch (source.kind) {
+			case 'file':
+				return await encodeAvifFileInWorker(source.file, settings.maxDimension, quality01, avif);
+			case 'bitmap':
+				return await encodeBitmap(source.bitmap, format === 'webp' ? 'image/webp' : 'image/avif', quality01);
+			case 'pixels':
+				return await encodeAvifInWorker(source.imageData, quality01, avif);
+		}
+	}
+
+	function markConverting(item: Item) {
+		item.status = 'converting';
+		item.error = null;
+		scheduleRender();
+	}
+
+	function markError(item: Item, err: unknown) {
+		console.error(err);
+		item.status = 'error';
+		item.error = err instanceof Error ? err.message : String(err);
+		scheduleRender();
 	}
 
 	async function convertOne(itemId: number) {
@@ -526,38 +874,7 @@ function main() {
 		setBusy(true);
 
 		try {
-			const format = formatSelect.value as OutputFormat;
-			const quality01 = Number(qualitySlider.value) / 100;
-			item.status = 'converting';
-			item.error = null;
-			render();
-
-			const imageData = await decodeToImageData(item.file);
-
-			let blob: Blob;
-
-			if (format === 'webp') {
-				const canvas = document.createElement('canvas');
-				canvas.width = imageData.width;
-				canvas.height = imageData.height;
-				const ctx = canvas.getContext('2d');
-				if (!ctx) throw new Error('Canvas 2D コンテキストを作成できませんでした。');
-				ctx.putImageData(imageData, 0, 0);
-				blob = await canvasToBlob(canvas, 'image/webp', quality01);
-			} else {
-				blob = await encodeAvifInWorker(imageData, quality01);
-			}
-
-			item.outputBlob = blob;
-			item.outputMime = blob.type || (format === 'webp' ? 'image/webp' : 'image/avif');
-			item.outputSize = blob.size;
-			item.status = 'done';
-			render();
-		} catch (err) {
-			console.error(err);
-			item.status = 'error';
-			item.error = err instanceof Error ? err.message : String(err);
-			render();
+			await convertOneInternal(item, readSettings());
 		} finally {
 			setBusy(false);
 		}
@@ -569,59 +886,87 @@ function main() {
 		setBusy(true);
 
 		try {
-			for (const item of items) {
-				// Skip already done items if settings haven't changed (we clear outputs on settings change)
-				if (item.status === 'done' && item.outputBlob) continue;
-				await convertOneInternal(item);
+			// Skip already done items if settings haven't changed (we clear outputs on settings change)
+			const pending = items.filter((item) => !(item.status === 'done' && item.outputBlob));
+			const settings = readSettings();
+
+			// Pass-through items need neither decode nor encode, so they stay out of the pipeline.
+			const toEncode: Item[] = [];
+			for (const item of pending) {
+				if (keepsOriginal(item.file, settings)) await convertOneInternal(item, settings);
+				else toEncode.push(item);
 			}
+			const lanes = Math.min(await encodeLanes(settings.format), toEncode.length);
+
+			// Decode ahead of the encoders so file reads and decoding overlap with encoding.
+			// Queued sources can be full-resolution bitmaps, so the look-ahead is a small fixed
+			// number rather than scaling with core count. File sources are produced instantly,
+			// so a small bound does not starve the encoders either.
+			const decoded = createBoundedQueue<{ item: Item; source: EncodeSource }>(DECODE_AHEAD);
+
+			const produce = async () => {
+				try {
+					for (const item of toEncode) {
+						try {
+							const source = await decodeStage(item.file, settings);
+							await decoded.put({ item, source });
+						} catch (err) {
+							markError(item, err);
+						}
+					}
+				} finally {
+					decoded.close();
+				}
+			};
+
+			const consume = async () => {
+				for (let job = await decoded.take(); job; job = await decoded.take()) {
+					await convertOneInternal(job.item, settings, job.source);
+				}
+			};
+
+			await Promise.all([produce(), ...Array.from({ length: lanes }, consume)]);
 		} finally {
 			setBusy(false);
 			render();
 		}
 	}
 
-	async function convertOneInternal(item: Item) {
-		const format = formatSelect.value as OutputFormat;
-		const quality01 = Number(qualitySlider.value) / 100;
-		item.status = 'converting';
-		item.error = null;
-		render();
+	async function convertOneInternal(item: Item, settings: EncodeSettings, source?: EncodeSource) {
+		markConverting(item);
 
 		try {
-			const imageData = await decodeToImageData(item.file);
 			let blob: Blob;
-			if (format === 'webp') {
-				const canvas = document.createElement('canvas');
-				canvas.width = imageData.width;
-				canvas.height = imageData.height;
-				const ctx = canvas.getContext('2d');
-				if (!ctx) throw new Error('Canvas 2D コンテキストを作成できませんでした。');
-				ctx.putImageData(imageData, 0, 0);
-				blob = await canvasToBlob(canvas, 'image/webp', quality01);
+			if (keepsOriginal(item.file, settings)) {
+				blob = new Blob([item.file], { type: `image/${settings.format}` });
 			} else {
-				blob = await encodeAvifInWorker(imageData, quality01);
+				blob = await encodeStage(source ?? (await decodeStage(item.file, settings)), settings);
+				// Without pass-through, a same-format input is re-encoded at the chosen quality,
+				// but the original still wins when the re-encode did not make it smaller.
+				if (
+					settings.maxDimension === 0 &&
+					isFileOfFormat(item.file, settings.format) &&
+					blob.size >= item.file.size
+				) {
+					blob = new Blob([item.file], { type: `image/${settings.format}` });
+				}
 			}
-
 			item.outputBlob = blob;
-			item.outputMime = blob.type || (format === 'webp' ? 'image/webp' : 'image/avif');
+			item.outputMime = blob.type || (settings.format === 'webp' ? 'image/webp' : 'image/avif');
+			item.outputName = `${item.baseName}.${settings.format}`;
 			item.outputSize = blob.size;
 			item.status = 'done';
 			item.error = null;
-			render();
+			scheduleRender();
 		} catch (err) {
-			console.error(err);
-			item.status = 'error';
-			item.error = err instanceof Error ? err.message : String(err);
-			render();
+			markError(item, err);
 		}
 	}
 
 	async function download(itemId: number) {
 		const item = items.find((x) => x.id === itemId);
-		if (!item?.outputBlob) return;
-		const format = formatSelect.value as OutputFormat;
-		const outputFilename = withExt(item.file.name, format === 'webp' ? 'webp' : 'avif');
-		await saveBlob(item.outputBlob, outputFilename);
+		if (!item?.outputBlob || !item.outputName) return;
+		await saveBlob(item.outputBlob, item.outputName);
 	}
 
 	async function downloadAllAsZip() {
@@ -632,9 +977,8 @@ function main() {
 		clearError();
 		setBusy(true);
 		try {
-			const format = formatSelect.value as OutputFormat;
 			const zipEntries = done.map((it) => ({
-				name: withExt(it.file.name, format === 'webp' ? 'webp' : 'avif'),
+				name: it.outputName!,
 				blob: it.outputBlob!,
 			}));
 			const zipBlob = await buildZip(zipEntries);
@@ -667,7 +1011,43 @@ function main() {
 		clearOutputs();
 	});
 
+	// Speed and chroma subsampling only apply to the WASM encoder; the native toBlob path
+	// ignores them, so the controls stay hidden once the probe reports native AVIF support.
+	let nativeAvif = false;
+
+	function updateAvifOptions() {
+		avifOptionsEl.classList.toggle('hidden', formatSelect.value !== 'avif' || nativeAvif);
+	}
+
+	function prewarmEncoders() {
+		if (formatSelect.value !== 'avif') return;
+		const settings = readSettings();
+		const toEncode = items.filter(
+			(item) => !(item.status === 'done' && item.outputBlob) && !keepsOriginal(item.file, settings)
+		).length;
+		if (toEncode > 0) void prewarmAvifWorkers(toEncode);
+	}
+
 	formatSelect.addEventListener('change', () => {
+		updateAvifOptions();
+		clearOutputs();
+		prewarmEncoders();
+	});
+
+	sizeSelect.addEventListener('change', () => {
+		clearOutputs();
+	});
+
+	keepSameFormatCheckbox.addEventListener('change', () => {
+		clearOutputs();
+		prewarmEncoders();
+	});
+
+	speedSelect.addEventListener('change', () => {
+		clearOutputs();
+	});
+
+	subsampleSelect.addEventListener('change', () => {
 		clearOutputs();
 	});
 
@@ -678,6 +1058,15 @@ function main() {
 		void downloadAllAsZip();
 	});
 
+	// One delegated listener for the per-row buttons instead of two closures per row per render.
+	fileList.addEventListener('click', (ev) => {
+		const btn = (ev.target as Element | null)?.closest<HTMLButtonElement>('button[data-action]');
+		if (!btn || btn.disabled) return;
+		const itemId = Number(btn.dataset.itemId);
+		if (btn.dataset.action === 'convert') void convertOne(itemId);
+		else if (btn.dataset.action === 'download') void download(itemId);
+	});
+
 	pickBtn.addEventListener('click', openPicker);
 	dropzone.addEventListener('click', openPicker);
 	clearBtn.addEventListener('click', () => {
@@ -714,6 +1103,11 @@ function main() {
 		}
 	});
 
+	updateAvifOptions();
+	void supportsNativeAvif().then((native) => {
+		nativeAvif = native;
+		updateAvifOptions();
+	});
 	render();
 }
 
@@ -0,0 +1,28 @@
+// Shared by the main thread (converter.ts) and the AVIF worker so both decode paths
+// resize and release images the same way.
+
+// Encode time scales with pixel count, so oversized inputs are shrunk right after decode
+// until the longer side fits maxDimension. Images are never upscaled.
+export async function decodeBitmap(file: Blob, maxDimension: number): Promise<ImageBitmap> {
+	const bitmap = await createImageBitmap(file);
+	const scale = maxDimension > 0 ? maxDimension / Math.max(bitmap.width, bitmap.height) : 1;
+	if (scale >= 1) return bitmap;
+	try {
+		return await createImageBitmap(bitmap, {
+			resizeWidth: Math.max(1, Math.round(bitmap.width * scale)),
+			resizeHeight: Math.max(1, Math.round(bitmap.height * scale)),
+			resizeQuality: 'high',
+		});
+	} finally {
+		bitmap.close();
+	}
+}
+
+// Free decoded pixels as soon as they have been consumed instead of waiting for GC:
+// close() drops the bitmap, and a 0x0 resize drops the canvas backing store.
+// Both are safe to repeat, so this can run in a finally block.
+export function releaseDecoded(bitmap: ImageBitmap, canvas: HTMLCanvasElement | OffscreenCanvas) {
+	bitmap.close();
+	canvas.width = 0;
+	canvas.height = 0;
+}
@@ -1,15 +1,5 @@
-type AvifEncodeRequest = {
-	type: 'encode-avif';
-	id: number;
-	width: number;
-	height: number;
-	rgba: ArrayBuffer;
-	quality: number; // 0.0 - 1.0
-};
-
-type AvifEncodeResponse =
-	| { type: 'encode-avif-result'; id: number; ok: true; mime: 'image/avif'; bytes: ArrayBuffer }
-	| { type: 'encode-avif-result'; id: number; ok: false; error: string };
+import type { AvifEncodeRequest, AvifEncodeResponse, AvifWarmupRequest } from '../scripts/avif-messages';
+import { decodeBitmap, releaseDecoded } from '../scripts/image-decode';
 
 declare const self: DedicatedWorkerGlobalScope;
 
@@ -26,18 +16,85 @@ function toTransferable(bytes: Uint8Array): ArrayBuffer {
 	return bytes.buffer.slice(start, end);
 }
 
-self.addEventListener('message', async (ev: MessageEvent<AvifEncodeRequest>) => {
+async function decodeFile(file: Blob, maxDimension: number): Promise<ImageData> {
+	const bitmap = await decodeBitmap(file, maxDimension);
+	const canvas = new OffscreenCanvas(bitmap.width, bitmap.height);
+	try {
+		const ctx = canvas.getContext('2d', { willReadFrequently: true });
+		if (!ctx) throw new Error('Canvas 2D コンテキストを作成できませんでした。');
+		ctx.drawImage(bitmap, 0, 0);
+		return ctx.getImageData(0, 0, canvas.width, canvas.height);
+	} finally {
+		releaseDecoded(bitmap, canvas);
+	}
+}
+
+function floorLog2(n: number): number {
+	let log2 = 0;
+	while (n >= 2) {
+		n = Math.floor(n / 2);
+		log2++;
+	}
+	return log2;
+}
+
+// Port of libavif's splitTilesLog2(): give the longer dimension enough extra tiles to
+// make tiles roughly square, then share what is left evenly. dim1 must be >= dim2.
+function splitTilesLog2(dim1: number, dim2: number, tilesLog2: number): number {
+	const diffLog2 = floorLog2(Math.floor(dim1 / dim2));
+	const subtract = Math.max(0, tilesLog2 - diffLog2);
+	return Math.min(tilesLog2, diffLog2 + (subtract >> 1));
+}
+
+// Port of libavif's avifSetTileConfiguration() (used by --autotiling): one tile per thread,
+// but no tile smaller than 512x512 and none larger than 4096x2304 pixels.
+// AV1 allows at most 64 tile columns/rows (log2 6).
+function autoTiling(width: number, height: number, threads: number) {
+	const area = width * height;
+	const tiles = Math.max(Math.ceil(area / (4096 * 2304)), Math.min(threads, Math.ceil(area / (512 * 512))));
+	const tilesLog2 = floorLog2(tiles);
+	if (width >= height) {
+		const tileColsLog2 = splitTilesLog2(width, height, tilesLog2);
+		return { tileColsLog2: Math.min(6, tileColsLog2), tileRowsLog2: Math.min(6, tilesLog2 - tileColsLog2) };
+	}
+	const tileRowsLog2 = splitTilesLog2(height, width, tilesLog2);
+	return { tileColsLog2: Math.min(6, tilesLog2 - tileRowsLog2), tileRowsLog2: Math.min(6, tileRowsLog2) };
+}
+
+// A 1x1 encode forces the module import and WASM instantiation, so the first real
+// request does not pay for them. Failures resurface on that request, so they are ignored here.
+async function warmup() {
+	try {
+		const { encode } = await getAvifMod();
+		await encode(new ImageData(1, 1), { speed: 10 });
+	} catch {
+		// ignored: see above
+	}
+}
+
+self.addEventListener('message', async (ev: MessageEvent<AvifEncodeRequest | AvifWarmupRequest>) => {
 	const msg = ev.data;
-	if (!msg || msg.type !== 'encode-avif') return;
+	if (msg?.type === 'warmup') {
+		await warmup();
+		return;
+	}
+	if (!msg || (msg.type !== 'encode-avif' && msg.type !== 'encode-avif-file')) return;
 
 	try {
 		const { encode } = await getAvifMod();
-		const rgba = new Uint8ClampedArray(msg.rgba);
-		const imageData = new ImageData(rgba, msg.width, msg.height);
+		const imageData =
+			msg.type === 'encode-avif-file'
+				? await decodeFile(msg.file, msg.maxDimension)
+				: new ImageData(new Uint8ClampedArray(msg.rgba), msg.width, msg.height);
 		const quality = Math.round(msg.quality * 100);
 
+		// The multi-threaded encoder build is only picked when the page is cross-origin isolated;
+		// tiles cost a little size and buy nothing on the single-threaded build.
+		const tiling =
+			self.crossOriginIsolated && msg.threads > 1 ? autoTiling(imageData.width, imageData.height, msg.threads) : {};
+
 		// @jsquash/avif encodes ImageData-like RGBA into AVIF bytes.
-		const encoded = await encode(imageData, { quality });
+		const encoded = await encode(imageData, { quality, speed: msg.speed, subsample: msg.subsample, ...tiling });
 		const bytes = encoded instanceof Uint8Array ? encoded : new Uint8Array(encoded as ArrayBuffer);
 
 		const payload: AvifEncodeResponse = {